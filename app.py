@@ -1,208 +1,529 @@
 # app.py
 
 import streamlit as st
-from pypdf import PdfWriter, PdfReader
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import atexit
+import hashlib
 import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# The PDF and picture libraries (pypdf, Pillow, zopfli, ...) are only imported
+# inside the functions that need them, so the page shows up straight away on a
+# cold start instead of waiting for them to load first.
 
 # --- Configuration for your App ---
 APP_TITLE = "Super Simple PDF Shrinker! 📄✨"
 APP_ICON = "🎈"
 YOUR_LINKEDIN_URL = "https://www.linkedin.com/in/rajeevbhandari87/"
 YOUR_LOGO_PATH = "Logo.png" # IMPORTANT: Ensure 'Logo.png' is in the ROOT of your GitHub repository
+WORKER_COUNT = max(1, (os.cpu_count() or 1) - 1) # Page-squishing worker processes (one core is left for the app)
+STACKS_PER_WORKER = 4 # How many stacks of pages each worker gets, roughly
+MIN_PAGES_FOR_DEDUP = 3 # Hunting for duplicate bits only pays off from this many pages on
+ALREADY_SQUISHED_FRACTION = 0.9 # Skip re-squishing text & graphics when this much of it is already compressed
+KEEP_ORIGINAL_FRACTION = 0.98 # If shrinking saves less than 2%, the original is handed back untouched
+RESULT_FILES_KEPT = 16 # How many shrunken PDFs are kept on disk (for instant re-downloads) before the oldest go
+TEXT_SQUEEZE_LEVELS = {"Fast": 1, "Balanced": 6, "Max": 9} # Text & graphics squeeze choices -> deflate level
 
 # --- Function to Shrink PDF Size (The Engine Room) ---
-def reduce_pdf_size(uploaded_file, compression_level=9, image_quality=80):
+# Results are remembered (in memory, and on disk by file fingerprint + settings), so
+# shrinking the same file with the same settings again (e.g. after fiddling
+# with the slider and moving it back) is instant.
+@st.cache_data(max_entries=8, show_spinner=False)
+def reduce_pdf_size(file_digest, _uploaded_file, _reader, compression_level=9, image_quality=80, use_zopfli=False):
     """
     This magical function takes your PDF and makes it smaller!
     It works by squishing things like text and pictures inside.
 
     Args:
-        uploaded_file: The PDF file you uploaded.
-        compression_level (int): How much to squish text and graphics (0-9, 9 is most).
-                                 This doesn't make your images blurry!
-        image_quality (int): How much to squish pictures (0-100, 0 is most squished/blurry).
-                             This is where you save BIG on file size!
+        file_digest (str): A fingerprint of the uploaded file (see `fingerprint_pdf`).
+                           Together with the settings, this is what the result is remembered by.
+        _uploaded_file: The PDF file you uploaded. (The leading underscore tells
+                        Streamlit not to fingerprint the whole file again itself.)
+        _reader (PdfReader): The already-opened upload (see `get_reader`).
+        compression_level (int or None): How much to squish text and graphics (0-9, 9 is most).
+                                         None picks it page by page ("Auto").
+                                         This doesn't make your images blurry!
+        image_quality (int or None): How much to squish pictures (0-100, 0 is most squished/blurry).
+                                     This is where you save BIG on file size!
+                                     None leaves the pictures completely alone (lossless only).
+        use_zopfli (bool): Squeeze text and graphics extra hard with zopfli (much slower).
 
     Returns:
-        tuple: (The shrunken PDF, original size in bytes, new size in bytes).
-               Returns (None, None, None) if something goes wrong.
-    """
-    try:
-        original_pdf_bytes = uploaded_file.getvalue()
-        original_size_bytes = len(original_pdf_bytes)
-
-        reader = PdfReader(io.BytesIO(original_pdf_bytes))
-        writer = PdfWriter()
-
-        # Go through each page of your PDF
-        for page_num in range(len(reader.pages)):
-            page_from_reader = reader.pages[page_num]
-
-            # Add the page to our new (soon-to-be-shrunken) PDF
-            writer.add_page(page_from_reader)
-
-            # Get the page we just added so we can work on it
-            current_page_in_writer = writer.pages[-1]
-
-            # Apply lossless compression to text, lines, etc.
-            current_page_in_writer.compress_content_streams(level=compression_level)
-
-            # --- Reduce image quality if you want a smaller file ---
-            if image_quality < 100:
-                for img in current_page_in_writer.images:
-                    try:
-                        # pypdf's replace method primarily handles quality, not resampling
-                        img.replace(img.image, quality=image_quality)
-                    except Exception as e:
-                        st.warning(f"Couldn't make an image smaller on a page (might be a special type or already heavily compressed). Error: {e}")
-
-        # Optimize the PDF even further: remove duplicates and unused bits
-        writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
-
-        # Save the shrunken PDF into a temporary space in your computer's memory
-        output_pdf_bytes = io.BytesIO()
-        writer.write(output_pdf_bytes)
-        output_pdf_bytes.seek(0)
-        compressed_size_bytes = len(output_pdf_bytes.getvalue())
-
-        return output_pdf_bytes, original_size_bytes, compressed_size_bytes
-
-    except Exception as e:
-        st.error(f"Oh no! Something went wrong while shrinking your PDF: {e}. "
-                 "This can happen with very old or damaged PDFs. Please try a different file.")
-        return None, None, None
-
-# --- Streamlit User Interface (What you see!) ---
+        tuple: (Where the shrunken PDF is saved on disk, original size in bytes, new size in bytes).
+               If the original was already as small as it gets, it's handed back
+               untouched (and both sizes are the same).
 
-# Set up the basic look of your app page
-st.set_page_config(
-    layout="centered",
-    page_title=APP_TITLE,
-    page_icon=APP_ICON
-)
+    Raises:
+        Exception: Whatever went wrong (e.g. a damaged PDF). Problems are raised instead
+                   of returned, so Streamlit doesn't remember them: clicking again retries.
+    """
+    from pypdf import PdfWriter
+    from pdf_shrink import declutter, flate_encoded_fraction, is_picture_only
+
+    # Each file + settings combination has its own spot in the results folder,
+    # so a result that dropped out of the memory above can still be picked up from disk.
+    result_path = os.path.join(get_results_dir(),
+                               f"{file_digest}_{compression_level}_{image_quality}_{int(use_zopfli)}.pdf")
+    if os.path.exists(result_path):
+        os.utime(result_path) # Mark it as freshly used, so it isn't tidied away next
+        return result_path, _uploaded_file.size, os.path.getsize(result_path)
+
+    # Park the upload in a temporary file on disk instead of keeping extra
+    # copies in memory - the workers read their pages straight from there.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source_path = os.path.join(temp_dir, "original.pdf")
+        _uploaded_file.seek(0)
+        with open(source_path, "wb") as source_file:
+            shutil.copyfileobj(_uploaded_file, source_file)
+        original_size_bytes = os.path.getsize(source_path)
+
+        page_count = len(_reader.pages)
+        leave_pictures = image_quality is None or image_quality >= 100
+        if leave_pictures and not use_zopfli and flate_encoded_fraction(_reader) >= ALREADY_SQUISHED_FRACTION:
+            # Pictures stay as they are and the text & graphics are already
+            # squished, so all that's left to do is the decluttering below
+            writer = PdfWriter(clone_from=_reader)
+        elif leave_pictures and is_picture_only(_reader):
+            # A scanned PDF whose pictures stay as they are: there's nothing
+            # for the workers to squish, so again it's only decluttered
+            writer = PdfWriter(clone_from=_reader)
+        else:
+            squish_content = not is_picture_only(_reader)
+            if not squish_content:
+                st.caption("🖼️ This looks like a scanned (picture-only) PDF, so we're skipping "
+                           "the text & graphics step and going straight for the pictures.")
+            writer = shrink_pages(source_path, page_count,
+                                  compression_level, image_quality, use_zopfli, squish_content)
+            if _reader.metadata:
+                writer.add_metadata(_reader.metadata)
+
+    # Optimize the PDF even further: remove duplicates and unused bits.
+    # This has to look at all pages at once, so it stays here in one piece.
+    # Duplicates mostly come from pages repeating each other, so for really
+    # short documents we only do the quick sweep for unused bits.
+    declutter(writer, remove_duplicates=page_count >= MIN_PAGES_FOR_DEDUP)
+
+    # Save the shrunken PDF straight into a private temporary file on disk,
+    # so it never has to sit in memory in one piece. Only its location is remembered.
+    # It's only moved to its proper spot once it's complete, so nobody else can
+    # pick up a half-written file.
+    with tempfile.NamedTemporaryFile(dir=get_results_dir(), suffix=".part", delete=False) as output_file:
+        writer.write(output_file)
+        output_file.flush()
+        compressed_size_bytes = os.fstat(output_file.fileno()).st_size
+        if compressed_size_bytes >= KEEP_ORIGINAL_FRACTION * original_size_bytes:
+            # Shrinking barely helped (or even made it bigger), so hand back the original
+            output_file.seek(0)
+            output_file.truncate()
+            _uploaded_file.seek(0)
+            shutil.copyfileobj(_uploaded_file, output_file)
+            compressed_size_bytes = original_size_bytes
+    os.replace(output_file.name, result_path)
+    tidy_results_dir()
+
+    return result_path, original_size_bytes, compressed_size_bytes
+
+@st.cache_resource
+def get_executor():
+    """
+    The team of worker processes that squish pages. It's started once and shared
+    by everyone using the app, so nobody waits for new workers on every click.
+    One CPU core is left free so the app itself stays snappy.
+
+    Workers are started from a small "forkserver" helper process (or spawned
+    fresh where that's not available) rather than copied from the busy,
+    multi-threaded Streamlit server, which is safer: a copy of a server with
+    threads can end up stuck on a lock one of those threads was holding.
+    Each new worker loads this file once, without drawing the page (see `main`).
+    They're shut down tidily when the app stops.
+    """
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    executor = ProcessPoolExecutor(max_workers=WORKER_COUNT,
+                                   mp_context=multiprocessing.get_context(start_method))
+    atexit.register(executor.shutdown)
+    return executor
+
+@st.cache_resource
+def get_results_dir():
+    """
+    A private temporary folder for the shrunken PDFs, shared by everyone
+    using the app. It's deleted (with everything in it) when the app stops.
+    """
+    results_dir = tempfile.mkdtemp(prefix="pdf_shrinker_")
+    atexit.register(shutil.rmtree, results_dir, ignore_errors=True)
+    return results_dir
 
-# --- Logo Centering ---
-col_logo_left, col_logo_center, col_logo_right = st.columns([1, 0.5, 1])
+def tidy_results_dir():
+    """
+    Deletes the oldest shrunken PDFs, keeping only the newest RESULT_FILES_KEPT.
+    Half-written ones (still called `.part`) belong to a shrink that's still
+    going, so they're left alone.
+    """
+    result_files = []
+    with os.scandir(get_results_dir()) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".pdf"):
+                continue
+            try:
+                result_files.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                pass # Someone else tidied it away already
+    result_files.sort(reverse=True)
+    for _, old_path in result_files[RESULT_FILES_KEPT:]:
+        try:
+            os.remove(old_path)
+        except FileNotFoundError:
+            pass # Someone else tidied it away already
+        except PermissionError:
+            pass # Still open for someone's download (Windows won't delete open files), so it goes next time
+
+def get_shrunk_pdf(shrink_args, use_zopfli):
+    """
+    Runs `reduce_pdf_size` and opens the shrunken PDF it hands back. A remembered
+    result may have been tidied away since, in which case it's shrunk again -
+    right here in the script run, with the usual progress bar and messages.
 
-with col_logo_center:
+    Returns:
+        tuple: (The opened shrunken PDF, original size in bytes, new size in bytes).
+    """
+    result_path, original_size_bytes, compressed_size_bytes = reduce_pdf_size(*shrink_args, use_zopfli=use_zopfli)
     try:
-        st.image(YOUR_LOGO_PATH, width=150)
+        result_file = open(result_path, "rb")
     except FileNotFoundError:
-        st.warning("Logo file 'Logo.png' not found. Make sure it's in the root of your GitHub repo.")
-    except Exception as e:
-        st.error(f"An unexpected error occurred while loading the logo: {e}")
+        reduce_pdf_size.clear(*shrink_args, use_zopfli=use_zopfli)
+        result_path, original_size_bytes, compressed_size_bytes = reduce_pdf_size(*shrink_args, use_zopfli=use_zopfli)
+        result_file = open(result_path, "rb")
+    return result_file, original_size_bytes, compressed_size_bytes
 
-st.title(f"{APP_ICON} {APP_TITLE}")
-st.markdown("Got a PDF that's too big? Let's make it smaller! "
-            "Perfect for emails, uploads, and saving space. ✨")
-
-# --- 1. Upload Your PDF Here Section ---
-st.markdown("---") # Separator
-st.subheader("1. Upload Your PDF Here 👇")
-
-uploaded_file = st.file_uploader("Drag and drop your PDF or click to browse", type="pdf")
+def hold_result(result_file):
+    """
+    Keeps this session's shrunken PDF open for its download button, until the
+    session shrinks something else (then the old one is closed). A file that's
+    open can still be read after it's tidied away from the results folder, so
+    a busy app can't pull the download out from under anyone, however long
+    the click takes.
+    """
+    old_file = st.session_state.get("result_file")
+    if old_file is not None:
+        old_file.close()
+    st.session_state["result_file"] = result_file
 
-if uploaded_file is not None:
-    original_size_bytes_display = len(uploaded_file.getvalue())
-    st.info(f"**Original PDF Size:** **`{original_size_bytes_display / (1024*1024):.2f} MB`** 📏")
+def read_result(result_file):
+    """Reads the whole shrunken PDF back, for the download button (only once it's clicked)."""
+    result_file.seek(0)
+    return result_file.read()
 
-    st.markdown("---") # Separator
-    st.subheader("2. Choose How Small You Want It! 👇")
-    st.markdown("This tool works best by adjusting **Picture Quality**. The **lower** the quality value, the **smaller** the file (but pictures might get a little blurry).")
-    st.markdown("If you need a very small file (e.g., under 10MB), you'll likely need to reduce the Picture Quality significantly.")
-
-    # --- New: Heavy Download Scale Checkbox ---
-    st.markdown("### Advanced Options for Extreme Shrinking")
-    heavy_download_scale = st.checkbox(
-        "⚡ **Heavy Download Scale (Aggressive Shrink)**",
-        help="Check this for maximum file size reduction, which will apply the lowest possible picture quality. "
-             "Use this if your file is still too large after trying the slider. "
-             "Note: This might make images very blurry."
-    )
+def shrink_pages(source_path, page_count, compression_level, image_quality, use_zopfli, squish_content=True):
+    """
+    Shares the pages out between the worker processes - each worker squishes its
+    own little stack of pages at the same time as the others - and glues the
+    shrunken stacks back together, in order. A progress bar shows how far along we are.
 
-    # --- Conditional Slider based on Checkbox ---
-    if heavy_download_scale:
-        image_quality = 5 # Force a very low quality when checked
-        st.info(f"**Heavy Download Scale Active:** Picture Quality set to **`{image_quality}%`** for maximum compression. The slider below is now inactive.")
-        quality_setting = st.slider(
-            "🖼️ **Picture Quality** (Lower Value = Smaller File)",
-            min_value=0, max_value=100, value=image_quality, step=5,
-            disabled=True, # Disable the slider
-            help="This slider is disabled because 'Heavy Download Scale' is active."
-        )
+    Returns:
+        PdfWriter: All the shrunken pages.
+    """
+    from pypdf import PdfReader, PdfWriter
+    from pdf_shrink import compress_page_bytes, split_page_ranges
+
+    progress_bar = st.progress(0.0, text="Squishing pages...")
+    writer = PdfWriter()
+    problems = [] # Shown all together at the end, not one message per picture
+
+    def glue(shrunk_chunk):
+        chunk_pdf_bytes, chunk_problems = shrunk_chunk
+        problems.extend(chunk_problems)
+        writer.append(PdfReader(io.BytesIO(chunk_pdf_bytes)))
+
+    def glue_stacks(executor):
+        # A few stacks per worker, so the progress bar moves along smoothly
+        page_ranges = split_page_ranges(page_count, WORKER_COUNT * STACKS_PER_WORKER)
+        futures = {
+            executor.submit(compress_page_bytes, source_path, start, stop,
+                            compression_level, image_quality, use_zopfli, squish_content): chunk_num
+            for chunk_num, (start, stop) in enumerate(page_ranges)
+        }
+        # Stacks are glued on as soon as all the ones before them are done,
+        # while the workers are still busy with the rest
+        shrunk_chunks = {}
+        next_chunk_num = 0
+        for done_count, future in enumerate(as_completed(futures), start=1):
+            shrunk_chunks[futures[future]] = future.result()
+            while next_chunk_num in shrunk_chunks:
+                glue(shrunk_chunks.pop(next_chunk_num)) # Let go of each stack once it's glued on
+                next_chunk_num += 1
+            start, stop = page_ranges[futures[future]]
+            progress_bar.progress(done_count / len(page_ranges),
+                                  text=f"Squished pages {start + 1}-{stop} of {page_count}...")
+
+    if WORKER_COUNT == 1:
+        page_ranges = split_page_ranges(page_count, 1)
+        glue(compress_page_bytes(source_path, *page_ranges[0],
+                                 compression_level, image_quality, use_zopfli, squish_content))
     else:
-        quality_setting = st.slider(
-            "🖼️ **Picture Quality** (Lower Value = Smaller File)",
-            min_value=0, max_value=100, value=60, step=5, # Changed default to 60 to encourage more reduction
-            help="This controls the quality of images in your PDF. "
-                 "**100 = Best Quality (largest file)**; **0 = Lowest Quality (smallest file, pictures might be very blurry)**. "
-                 "Drag this slider towards 0 for the biggest file size reduction!"
-        )
-        image_quality = quality_setting
-        st.markdown(f"**Your Current Picture Quality Setting:** **`{quality_setting}%`** (Drag left for smaller files)")
-
+        executor = get_executor()
+        try:
+            glue_stacks(executor)
+        except BrokenProcessPool:
+            # A worker died (e.g. it was killed for using too much memory), which
+            # breaks the whole team for everyone. Swap in a fresh team (unless
+            # someone else already did) and start over once; if that breaks
+            # too, the error is shown as usual.
+            executor.shutdown(wait=False, cancel_futures=True)
+            if get_executor() is executor:
+                get_executor.clear()
+            writer = PdfWriter()
+            problems.clear()
+            progress_bar.progress(0.0, text="Squishing pages (second try)...")
+            glue_stacks(get_executor())
+
+    progress_bar.empty()
+    show_problems(problems)
+    return writer
+
+def describe_pages(page_nums, max_listed=10):
+    """Turns page numbers into friendly text, like "pages 2, 5 and 9"."""
+    page_nums = sorted(set(page_nums))
+    listed = [str(page_num) for page_num in page_nums[:max_listed]]
+    if len(page_nums) > max_listed:
+        listed.append(f"{len(page_nums) - max_listed} more")
+    if len(listed) == 1:
+        return f"page {listed[0]}"
+    return f"pages {', '.join(listed[:-1])} and {listed[-1]}"
+
+def show_problems(problems):
+    """
+    Sums up the problems the workers ran into: one warning per kind of problem
+    (with how often it happened and where), instead of one warning each.
 
-    compression_level = 9 # Keep lossless compression high
+    Args:
+        problems (list): (kind, page number, details) tuples from `compress_page_bytes`.
+    """
+    from pdf_shrink import CONTENT_PROBLEM, PICTURE_PROBLEM
+
+    counts = Counter(kind for kind, _, _ in problems)
+    if counts[PICTURE_PROBLEM]:
+        picture_problems = [(page_num, details) for kind, page_num, details in problems if kind == PICTURE_PROBLEM]
+        st.warning(f"Couldn't make {counts[PICTURE_PROBLEM]} picture(s) smaller on "
+                   f"{describe_pages(page_num for page_num, _ in picture_problems)} "
+                   f"(might be a special type or already heavily compressed). "
+                   f"They were left as they are. First error: {picture_problems[0][1]}")
+    if counts[CONTENT_PROBLEM]:
+        content_pages = [page_num for kind, page_num, _ in problems if kind == CONTENT_PROBLEM]
+        st.warning(f"The text & graphics on {describe_pages(content_pages)} are suspiciously huge "
+                   "once unpacked, so they were left as they are.")
+
+# Opening a PDF means reading its whole table of contents, so it's only done
+# once per upload instead of on every slider tick.
+@st.cache_resource(max_entries=4)
+def get_reader(file_id, _uploaded_file):
+    """
+    Opens the uploaded PDF once and keeps it open for as long as it's in use.
 
+    Args:
+        file_id (str): Streamlit's id for this particular upload.
+        _uploaded_file: The PDF file you uploaded.
 
-    if st.button("🚀 Shrink My PDF Now!", type="primary"):
-        with st.spinner("Processing... Your PDF is getting its workout! 💪"):
-            compressed_pdf_bytes, actual_original_size_bytes, actual_compressed_size_bytes = reduce_pdf_size(
-                uploaded_file, compression_level, image_quality
-            )
+    Returns:
+        PdfReader: The opened PDF.
+    """
+    from pypdf import PdfReader
 
-            if compressed_pdf_bytes:
-                reduction_percentage = ((actual_original_size_bytes - actual_compressed_size_bytes) / actual_original_size_bytes) * 100
+    _uploaded_file.seek(0)
+    return PdfReader(_uploaded_file) # Read straight from the upload, no extra copy
 
-                st.success("🎉 Your PDF has been successfully shrunk!")
+def fingerprint_pdf(uploaded_file):
+    """
+    Makes a short fingerprint of the uploaded file's contents, without copying it.
+    Identical files always get the same fingerprint.
+    """
+    uploaded_file.seek(0) # Always fingerprint the whole file, wherever it was last read up to
+    return hashlib.file_digest(uploaded_file, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
 
-                # --- Dynamic Size Animation / Feel the Difference ---
-                st.markdown("### **Feel the Difference!**")
-                col1, col2, col3 = st.columns([1, 0.5, 1])
+# --- Streamlit User Interface (What you see!) ---
+# The page itself only runs under `streamlit run` (where this file is `__main__`).
+# The worker processes load this file too (as `__mp_main__`), and they have no
+# business drawing the whole page once each.
+def main():
+    """Draws the app's page."""
+    # Set up the basic look of your app page
+    st.set_page_config(
+        layout="centered",
+        page_title=APP_TITLE,
+        page_icon=APP_ICON
+    )
 
-                with col1:
-                    st.metric(label="Original Size", value=f"{actual_original_size_bytes / (1024*1024):.2f} MB 📊")
-                with col2:
-                    st.markdown("## ➡️") # Simple arrow for visual flow
-                with col3:
-                    st.metric(label="Shrunk Size", value=f"{actual_compressed_size_bytes / (1024*1024):.2f} MB 👇")
+    # --- Logo Centering ---
+    col_logo_left, col_logo_center, col_logo_right = st.columns([1, 0.5, 1])
 
-                st.markdown(f"### **🥳 You Saved: `{reduction_percentage:.2f}%` of the original size!**")
+    with col_logo_center:
+        try:
+            st.image(YOUR_LOGO_PATH, width=150)
+        except FileNotFoundError:
+            st.warning("Logo file 'Logo.png' not found. Make sure it's in the root of your GitHub repo.")
+        except Exception as e:
+            st.error(f"An unexpected error occurred while loading the logo: {e}")
 
-                # Provide feedback on the 10MB goal
-                if actual_compressed_size_bytes < (10 * 1024 * 1024): # 10 MB in bytes
-                    st.balloons()
-                    st.success(f"✅ Success! Your PDF is now under 10MB ({actual_compressed_size_bytes / (1024*1024):.2f} MB)! Perfect for emails!")
-                else:
-                    st.info(f"Your PDF is now {actual_compressed_size_bytes / (1024*1024):.2f} MB. If you need it even smaller, and haven't tried, enable the 'Heavy Download Scale' option. For some PDFs (e.g., scanned documents), further reduction may not be possible with this tool without significant visual degradation.")
+    st.title(f"{APP_ICON} {APP_TITLE}")
+    st.markdown("Got a PDF that's too big? Let's make it smaller! "
+                "Perfect for emails, uploads, and saving space. ✨")
 
+    # --- 1. Upload Your PDF Here Section ---
+    st.markdown("---") # Separator
+    st.subheader("1. Upload Your PDF Here 👇")
+
+    uploaded_file = st.file_uploader("Drag and drop your PDF or click to browse", type="pdf")
+
+    if uploaded_file is not None:
+        original_size_bytes_display = uploaded_file.size # No need to copy the whole file just to measure it
+        try:
+            reader = get_reader(uploaded_file.file_id, uploaded_file)
+        except Exception as e:
+            st.error(f"Hmm, this doesn't look like a PDF we can open: {e}. Please try a different file.")
+            st.stop()
+        st.info(f"**Original PDF Size:** **`{original_size_bytes_display / (1024*1024):.2f} MB`** "
+                f"📏 ({len(reader.pages)} pages)")
+
+        st.markdown("---") # Separator
+        st.subheader("2. Choose How Small You Want It! 👇")
+        st.markdown("This tool works best by adjusting **Picture Quality**. The **lower** the quality value, the **smaller** the file (but pictures might get a little blurry).")
+        st.markdown("If you need a very small file (e.g., under 10MB), you'll likely need to reduce the Picture Quality significantly.")
+
+        # --- New: Heavy Download Scale Checkbox ---
+        st.markdown("### Advanced Options for Extreme Shrinking")
+        heavy_download_scale = st.checkbox(
+            "⚡ **Heavy Download Scale (Aggressive Shrink)**",
+            help="Check this for maximum file size reduction, which will apply the lowest possible picture quality "
+                 "and squeeze text & graphics extra hard (this part takes noticeably longer). "
+                 "Use this if your file is still too large after trying the slider. "
+                 "Note: This might make images very blurry."
+        )
 
-                st.download_button(
-                    label="⬇️ Download Your Shrunken PDF",
-                    data=compressed_pdf_bytes,
-                    file_name=f"shrunk_{uploaded_file.name}",
-                    mime="application/pdf",
-                    help="Click to download your newly shrunken PDF."
+        # --- Conditional Slider based on Checkbox ---
+        if heavy_download_scale:
+            image_quality = 5 # Force a very low quality when checked
+            st.info(f"**Heavy Download Scale Active:** Picture Quality set to **`{image_quality}%`** for maximum compression. The slider below is now inactive.")
+            quality_setting = st.slider(
+                "🖼️ **Picture Quality** (Lower Value = Smaller File)",
+                min_value=0, max_value=100, value=image_quality, step=5,
+                disabled=True, # Disable the slider
+                help="This slider is disabled because 'Heavy Download Scale' is active."
+            )
+        else:
+            recompress_pictures = st.checkbox(
+                "🖼️ **Recompress Pictures**", value=True,
+                help="Uncheck this to leave every picture exactly as it is and only do the lossless tidying up. "
+                     "Quicker, but usually saves a lot less."
+            )
+            if recompress_pictures:
+                quality_setting = st.slider(
+                    "🖼️ **Picture Quality** (Lower Value = Smaller File)",
+                    min_value=0, max_value=100, value=60, step=5, # Changed default to 60 to encourage more reduction
+                    help="This controls the quality of images in your PDF. "
+                         "**100 = Best Quality (largest file)**; **0 = Lowest Quality (smallest file, pictures might be very blurry)**. "
+                         "Drag this slider towards 0 for the biggest file size reduction!"
                 )
-
-                # --- New Humorous and Assuring Safety Message ---
-                st.markdown("---")
-                st.success("✨ **Privacy Check Complete!** ✨")
-                st.info("Your document was processed directly in our app's memory and **was never saved** to any server disk. "
-                        "Once you download it, your original file vanishes like magic! Poof! 💨")
-
-else: # This block displays when no file is uploaded yet
-    st.markdown("---") # Another separator
-
-    st.subheader("💡 How This PDF Shrinker Works:")
-    st.markdown("""
-    - **Smart Text & Graphics Shrinker:** This feature tidies up text and drawings without any loss in quality. It's like expertly packing a suitcase – everything fits better!
-    - **Picture Quality (Your Main Shrink Lever):** This is where the magic happens for big PDFs with images. It gently reduces picture quality to make the file much smaller. Less quality = much smaller file!
-    - **Digital Declutter:** The tool also cleans up your PDF by removing any hidden, unused bits, making it even lighter.
-    - **⚡ Heavy Download Scale:** An advanced option for extreme shrinking. This applies the lowest possible picture quality for maximum file size reduction.
-    """)
-    st.markdown("---")
-
-# --- Footer with your information ---
-st.markdown("Made with ❤️ by Rajeev Bhandari")
-st.markdown(f"Connect with me on [LinkedIn]({YOUR_LINKEDIN_URL})")
+                image_quality = quality_setting
+                st.markdown(f"**Your Current Picture Quality Setting:** **`{quality_setting}%`** (Drag left for smaller files)")
+            else:
+                image_quality = None # Pictures aren't touched at all
+                st.info("**Lossless Only:** Pictures stay exactly as they are; only text, graphics and hidden clutter get tidied up.")
+
+
+        # How hard to squish text & graphics (deflate level). "Auto" is worked out
+        # page by page by the engine (see `content_compression_level`).
+        text_squeeze = st.select_slider(
+            "📝 **Text & Graphics Squeeze**",
+            options=["Auto", *TEXT_SQUEEZE_LEVELS],
+            disabled=heavy_download_scale, # Heavy Download Scale always squeezes hardest
+            help="How hard to squeeze text, lines and shapes. This never makes anything blurry - "
+                 "it's only a trade-off between speed and size. "
+                 "**Fast** is quickest, **Max** is smallest, **Auto** picks for each page. "
+                 "Text & graphics that are already packed tighter than this are left as they are."
+        )
+        compression_level = TEXT_SQUEEZE_LEVELS.get(text_squeeze) # None on "Auto"
+
+
+        if st.button("🚀 Shrink My PDF Now!", type="primary"):
+            with st.spinner("Processing... Your PDF is getting its workout! 💪"):
+                shrink_args = (fingerprint_pdf(uploaded_file), uploaded_file, reader, compression_level, image_quality)
+                try:
+                    compressed_pdf_file, actual_original_size_bytes, actual_compressed_size_bytes = get_shrunk_pdf(
+                        shrink_args, heavy_download_scale
+                    )
+                except Exception as e:
+                    st.error(f"Oh no! Something went wrong while shrinking your PDF: {e}. "
+                             "This can happen with very old or damaged PDFs. Please try a different file.")
+                    compressed_pdf_file = None
+
+                if compressed_pdf_file is not None:
+                    hold_result(compressed_pdf_file)
+                    reduction_percentage = ((actual_original_size_bytes - actual_compressed_size_bytes) / actual_original_size_bytes) * 100
+
+                    if actual_compressed_size_bytes == actual_original_size_bytes:
+                        st.info("👌 Your PDF is already optimally compressed! Shrinking it any further wouldn't make "
+                                "a real difference, so you get your original file back, untouched.")
+                    else:
+                        st.success("🎉 Your PDF has been successfully shrunk!")
+
+                    # --- Dynamic Size Animation / Feel the Difference ---
+                    st.markdown("### **Feel the Difference!**")
+                    col1, col2, col3 = st.columns([1, 0.5, 1])
+
+                    with col1:
+                        st.metric(label="Original Size", value=f"{actual_original_size_bytes / (1024*1024):.2f} MB 📊")
+                    with col2:
+                        st.markdown("## ➡️") # Simple arrow for visual flow
+                    with col3:
+                        st.metric(label="Shrunk Size", value=f"{actual_compressed_size_bytes / (1024*1024):.2f} MB 👇")
+
+                    st.markdown(f"### **🥳 You Saved: `{reduction_percentage:.2f}%` of the original size!**")
+
+                    # Provide feedback on the 10MB goal
+                    if actual_compressed_size_bytes < (10 * 1024 * 1024): # 10 MB in bytes
+                        st.balloons()
+                        st.success(f"✅ Success! Your PDF is now under 10MB ({actual_compressed_size_bytes / (1024*1024):.2f} MB)! Perfect for emails!")
+                    else:
+                        st.info(f"Your PDF is now {actual_compressed_size_bytes / (1024*1024):.2f} MB. If you need it even smaller, and haven't tried, enable the 'Heavy Download Scale' option. For some PDFs (e.g., scanned documents), further reduction may not be possible with this tool without significant visual degradation.")
+
+
+                    st.download_button(
+                        label="⬇️ Download Your Shrunken PDF",
+                        # Only read from disk when actually clicked
+                        data=lambda: read_result(compressed_pdf_file),
+                        file_name=f"shrunk_{uploaded_file.name}",
+                        mime="application/pdf",
+                        help="Click to download your newly shrunken PDF."
+                    )
+
+                    # --- New Humorous and Assuring Safety Message ---
+                    st.markdown("---")
+                    st.success("✨ **Privacy Check Complete!** ✨")
+                    st.info("While we worked on your document, it sat in a private, temporary scratch space, "
+                            "and that scratch space is wiped the moment we're done. "
+                            "The result - the shrunken copy, or your original file itself if it couldn't get any smaller - "
+                            "stays in a private temporary folder on our server (so shrinking it again is instant) "
+                            "until newer files take its place or the app restarts. Then it's deleted. Poof! 💨")
+
+    else: # This block displays when no file is uploaded yet
+        st.markdown("---") # Another separator
+
+        st.subheader("💡 How This PDF Shrinker Works:")
+        st.markdown("""
+        - **Smart Text & Graphics Shrinker:** This feature tidies up text and drawings without any loss in quality. It's like expertly packing a suitcase – everything fits better!
+        - **Picture Quality (Your Main Shrink Lever):** This is where the magic happens for big PDFs with images. It gently reduces picture quality and scales big pictures down a little to make the file much smaller. Less quality = much smaller file!
+        - **Digital Declutter:** The tool also cleans up your PDF by removing any hidden, unused bits, making it even lighter.
+        - **⚡ Heavy Download Scale:** An advanced option for extreme shrinking. This applies the lowest possible picture quality and an extra-strong (but slower) text & graphics squeeze for maximum file size reduction.
+        """)
+        st.markdown("---")
+
+    # --- Footer with your information ---
+    st.markdown("Made with ❤️ by Rajeev Bhandari")
+    st.markdown(f"Connect with me on [LinkedIn]({YOUR_LINKEDIN_URL})")
+
+if __name__ == "__main__":
+    main()
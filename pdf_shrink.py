@@ -0,0 +1,846 @@
+# pdf_shrink.py
+
+"""
+The heavy lifting behind the PDF Shrinker that runs in the worker processes.
+
+This lives in its own module (instead of inside app.py) because Streamlit runs
+app.py as a brand new `__main__` script on every rerun, so functions defined
+there can't be reliably found again by the worker processes.
+Nothing in here talks to Streamlit - problems are handed back as messages.
+"""
+
+import functools
+import hashlib
+import io
+import logging
+import math
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import zopfli.zlib
+from zlib_ng import zlib_ng
+from PIL import Image, features
+from pypdf import PdfReader, PdfWriter
+from pypdf.errors import LimitReachedError, PyPdfError
+from pypdf.generic import (ArrayObject, ByteStringObject, DictionaryObject, EncodedStreamObject, NameObject,
+                           NumberObject)
+
+MIN_RESIZE_DIMENSION_PX = 200 # Pictures smaller than this (like icons) are never resized
+MIN_SHRINK_AREA_PX = 64 * 64 # Pictures with fewer pixels than this (tiny icons) aren't worth squishing at all
+# The longest side a picture may keep, by Picture Quality: (up to this quality, max pixels).
+# Above the last quality, pictures are only shrunk by the normal scale.
+MAX_LONG_EDGE_PX = ((40, 1200), (70, 2000))
+DISPLAY_DPI = 150 # Pixels per inch a picture needs to look sharp at the size it's drawn on the page
+DPI_LIMIT_MAX_QUALITY = 60 # Pictures are only cut down to DISPLAY_DPI at this Picture Quality and below
+DPI_LIMIT_SLACK = 2 # ... and only if they have more than this many times the pixels they need (per side)
+MAX_DPI_CHECK_CONTENT_BYTES = 256 * 1024 # Pages with more drawing instructions than this aren't read for it (slow)
+# Extra JPEG tricks that make pictures smaller at the same quality: an extra
+# pass to optimize the encoding tables, progressive encoding (which packs the
+# picture data more tightly) and 4:2:0 colour subsampling
+JPEG_SAVE_OPTIONS = {"optimize": True, "progressive": True, "subsampling": 2}
+
+# Big scans (an A3 page at 600 dpi is ~70 megapixels) are business as usual
+# here, so Pillow's "decompression bomb" guard gets a bit more headroom.
+# Truly absurd pictures (over twice this many pixels) are still refused.
+Image.MAX_IMAGE_PIXELS = 200_000_000
+
+# Official Pillow builds come with libjpeg-turbo, whose SIMD code squishes JPEGs
+# several times quicker than plain libjpeg - worth a heads-up if it's missing
+if not features.check_feature("libjpeg_turbo"):
+    logging.getLogger(__name__).warning(
+        "Pillow was built without libjpeg-turbo, so squishing pictures will be a lot slower. "
+        "Installing the official Pillow wheels fixes this.")
+
+
+# --- Text & Graphics Squeezer ---
+def recompress_content_streams(page, compress):
+    """
+    Like pypdf's `compress_content_streams`, but lets us pick the zlib
+    (FlateDecode) compressor: `compress` turns the raw bytes into zlib data.
+    The page's text & graphics are only replaced if that's actually smaller
+    (a quick squeeze of something already packed hard can make it bigger).
+
+    Returns:
+        bool: True if the page's text & graphics were replaced.
+    """
+    content = page.get_contents()
+    if content is None:
+        return False
+    packed_data = compress(content.get_data())
+    if len(packed_data) >= sum(len(stream._data) for stream in content_streams(page)):
+        return False
+    stream = EncodedStreamObject()
+    stream[NameObject("/Filter")] = NameObject("/FlateDecode")
+    stream._data = packed_data
+    page.replace_contents(stream)
+    return True
+
+
+def deflate(data, level):
+    """
+    Plain zlib compression, done by zlib-ng: a modern, SIMD-accelerated zlib
+    that's about 3x quicker at level 9 for practically the same size.
+    It uses the biggest (memLevel 9) working memory instead of the default 8,
+    which finds matches a bit quicker and better.
+    Every stream gets its own compressor: each PDF stream has to be a
+    complete zlib stream of its own.
+    """
+    compressor = zlib_ng.compressobj(level, zlib_ng.DEFLATED, zlib_ng.MAX_WBITS, 9)
+    return compressor.compress(data) + compressor.flush()
+
+
+# Extra-Strong Text & Graphics Squeezer (Heavy Download Scale only).
+# Zopfli tries much harder to find a small encoding, giving a few percent
+# smaller text and drawings that every PDF reader can still open (it is
+# plain FlateDecode). It is also a LOT slower, so it's only for heavy mode.
+def zopfli_deflate(data, iterations=15):
+    """Zlib compression done by zopfli."""
+    return zopfli.zlib.compress(data, numiterations=iterations)
+
+
+# --- Picture Resizer (the real size lever for scanned PDFs) ---
+def downsampled_size(size, image_quality, needed_size=None):
+    """
+    Works out how big a picture should be after `downsample`.
+
+    Args:
+        size (tuple): The picture's (width, height).
+        image_quality (int): How much to squish pictures (0-100, 0 is most squished/blurry).
+        needed_size (tuple or None): The (width, height) it needs to look sharp where
+                                     it's drawn (see `needed_picture_sizes`), if known.
+
+    Returns:
+        tuple or None: The new (width, height), or None if it's left at its size.
+    """
+    scale = 0.28 + (image_quality / 100) * 0.70
+    width, height = size
+    if min(width, height) < MIN_RESIZE_DIMENSION_PX:
+        return None
+    for max_quality, max_long_edge in MAX_LONG_EDGE_PX:
+        if image_quality <= max_quality:
+            scale = min(scale, max_long_edge / max(width, height))
+            break
+    if needed_size is not None:
+        # A picture drawn much smaller than its pixels (like a phone photo pasted
+        # into a report) is cut down to what it needs to look sharp at that size
+        oversampling = min(width / needed_size[0], height / needed_size[1])
+        if oversampling > DPI_LIMIT_SLACK:
+            scale = min(scale, 1 / oversampling)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def downsample(picture, image_quality, needed_size=None):
+    """
+    Shrinks a picture's width and height along with the quality setting.
+
+    File size grows with the number of pixels, so halving the width and height
+    makes a picture about 4x smaller no matter what the quality is. The scale
+    goes from 98% of the original size (quality 100) down to 28% (quality 0).
+    On top of that, really big pictures (like 4000x3000 photos) are capped to
+    a maximum size (see MAX_LONG_EDGE_PX) - nobody needs that many pixels on a page.
+    Pictures drawn a lot smaller than their pixels are worth (`needed_size`) are cut
+    down to DISPLAY_DPI. Small pictures (like icons and logos) are left untouched.
+    """
+    new_size = downsampled_size(picture.size, image_quality, needed_size)
+    if new_size is None:
+        return picture
+    return picture.resize(new_size, Image.Resampling.LANCZOS)
+
+
+# --- Picture Finder ---
+def filter_names(stream):
+    """Returns the list of filters (packing steps) of a PDF stream, outermost first."""
+    filters = stream.get("/Filter")
+    if filters is None:
+        return []
+    return list(filters) if isinstance(filters, list) else [filters]
+
+
+def x_objects_of(owner):
+    """
+    Returns the drawable things (pictures and forms) a page or form lists in its
+    resources, by name - or None if it doesn't list any.
+    """
+    resources = owner.get("/Resources")
+    resources = resources.get_object() if resources is not None else None
+    if not resources or "/XObject" not in resources:
+        return None
+    return resources["/XObject"].get_object()
+
+
+def image_fingerprint(image_obj):
+    """
+    A short fingerprint of a picture's raw (still packed) data and everything its
+    dictionary says about it - not just how to draw it, but also things like the
+    layer it belongs to (/OC) or its rendering intent. Only /Length is left out,
+    as it follows from the data. Pictures with the same fingerprint are
+    interchangeable.
+    """
+    settings = tuple(sorted((key, repr(value)) for key, value in image_obj.items() if key != "/Length"))
+    return hashlib.blake2b(image_obj._data, digest_size=16).digest(), settings
+
+
+def find_images(page, seen=None, fingerprints=None):
+    """
+    Finds the pictures on a page by walking its raw resources (including
+    pictures tucked inside forms), without unpacking any of them.
+    pypdf's `page.images` would decode every single picture just to list them.
+
+    Copies of a picture that's already been found (like a logo embedded again
+    on every page) are pointed at that first copy instead, so it only gets squished once.
+
+    Args:
+        page: A page of a PdfWriter.
+        seen (set): Pictures (and forms) already found, e.g. on earlier pages.
+                    They aren't listed again, so shared pictures are only squished once.
+        fingerprints (dict): `image_fingerprint` -> the first copy's reference, for the
+                             pictures already found.
+
+    Yields:
+        tuple: (image id for `page.images[...]`, the picture's PDF object).
+    """
+    if seen is None:
+        seen = set()
+    if fingerprints is None:
+        fingerprints = {}
+
+    def walk(owner, path):
+        x_objects = x_objects_of(owner)
+        if x_objects is None:
+            return
+        for name in x_objects:
+            x_object = x_objects[name].get_object()
+            if id(x_object) in seen or not hasattr(x_object, "get_data"):
+                continue # Already handled, or not a stream at all
+            seen.add(id(x_object))
+            if x_object.get("/Subtype") == "/Image":
+                fingerprint = image_fingerprint(x_object)
+                if fingerprint in fingerprints:
+                    x_objects[NameObject(name)] = fingerprints[fingerprint] # Use the first copy instead
+                    continue
+                if x_object.indirect_reference is not None:
+                    fingerprints[fingerprint] = x_object.indirect_reference
+                yield [*path, name], x_object
+            elif x_object.get("/Subtype") == "/Form":
+                yield from walk(x_object, [*path, name])
+
+    yield from walk(page, [])
+
+
+def drawn_sizes(page):
+    """
+    Follows a page's drawing instructions to see how big each picture on it is drawn.
+
+    Returns:
+        dict or None: Picture name -> the biggest (width, height) it's drawn at, in
+                      points (1/72 inch). None if the page has too many
+                      instructions to read quickly (so we can't tell).
+    """
+    contents = page.get_contents()
+    if contents is None:
+        return {}
+    if len(contents.get_data()) > MAX_DPI_CHECK_CONTENT_BYTES:
+        return None
+    # The "current transformation matrix" (a, b, c, d, e, f) maps a picture's unit
+    # square onto the page: (a, b) is where its width ends up, (c, d) its height
+    matrix, saved_matrices, sizes = (1, 0, 0, 1, 0, 0), [], {}
+    for operands, operator in contents.operations:
+        if operator == b"q":
+            saved_matrices.append(matrix)
+        elif operator == b"Q" and saved_matrices:
+            matrix = saved_matrices.pop()
+        elif operator == b"cm" and len(operands) == 6:
+            a, b, c, d, e, f = (float(operand) for operand in operands)
+            old_a, old_b, old_c, old_d, old_e, old_f = matrix
+            matrix = (a * old_a + b * old_c, a * old_b + b * old_d,
+                      c * old_a + d * old_c, c * old_b + d * old_d,
+                      e * old_a + f * old_c + old_e, e * old_b + f * old_d + old_f)
+        elif operator == b"Do" and operands:
+            width, height = math.hypot(matrix[0], matrix[1]), math.hypot(matrix[2], matrix[3])
+            old_width, old_height = sizes.get(operands[0], (0, 0))
+            sizes[operands[0]] = (max(width, old_width), max(height, old_height))
+    return sizes
+
+
+def needed_picture_sizes(pages):
+    """
+    Works out how many pixels the pictures drawn straight on some pages need to
+    look sharp at DISPLAY_DPI. Only pictures we know every use of are listed:
+    anything also drawn inside a form, or on a page we couldn't read, is left out.
+
+    Args:
+        pages (list): (page number, page) pairs.
+
+    Returns:
+        dict: id() of the picture's PDF object -> needed (width, height) in pixels.
+    """
+    needed, unknown, seen_forms = {}, set(), set()
+
+    def note_form_pictures(form):
+        if id(form) in seen_forms:
+            return
+        seen_forms.add(id(form))
+        x_objects = x_objects_of(form)
+        if x_objects is None:
+            return
+        for name in x_objects:
+            x_object = x_objects[name].get_object()
+            if x_object.get("/Subtype") == "/Image":
+                unknown.add(id(x_object))
+            elif x_object.get("/Subtype") == "/Form":
+                note_form_pictures(x_object)
+
+    for _, page in pages:
+        x_objects = x_objects_of(page)
+        if x_objects is None:
+            continue
+        try:
+            sizes = drawn_sizes(page)
+        except IMAGE_ERRORS:
+            sizes = None
+        for name in x_objects:
+            x_object = x_objects[name].get_object()
+            if x_object.get("/Subtype") == "/Form":
+                note_form_pictures(x_object)
+            elif x_object.get("/Subtype") != "/Image":
+                continue
+            elif sizes is None:
+                unknown.add(id(x_object))
+            elif name in sizes:
+                width, height = (points / 72 * DISPLAY_DPI for points in sizes[name])
+                old_width, old_height = needed.get(id(x_object), (0, 0))
+                needed[id(x_object)] = (max(width, old_width), max(height, old_height))
+    return {picture_id: size for picture_id, size in needed.items()
+            if picture_id not in unknown and min(size) >= 1}
+
+
+# Pictures we don't even try: 1-bit pictures (stencil masks and black & white
+# scans - JPEG can't make those any smaller), CCITT fax pictures (the same thing,
+# already packed very tightly) and JBIG2 (which needs an outside program just to unpack)
+UNSHRINKABLE_IMAGE_FILTERS = {"/JBIG2Decode", "/CCITTFaxDecode"}
+# What Pillow and pypdf raise for pictures they can't handle: broken or unknown
+# data (OSError), odd colour setups (ValueError), missing picture bits (KeyError),
+# unsupported PDF filters (NotImplementedError / PyPdfError) and absurdly huge pictures
+IMAGE_ERRORS = (OSError, ValueError, KeyError, NotImplementedError, PyPdfError, Image.DecompressionBombError)
+
+
+def is_shrinkable(image_obj):
+    """True if a picture is worth handing to the squishers at all (looked up without unpacking it)."""
+    if image_obj.get("/ImageMask") or image_obj.get("/BitsPerComponent") == 1:
+        return False
+    if "/Width" in image_obj and "/Height" in image_obj:
+        # Tiny pictures can't save anything worth the unpacking and re-packing
+        if int(image_obj["/Width"]) * int(image_obj["/Height"]) < MIN_SHRINK_AREA_PX:
+            return False
+    return not UNSHRINKABLE_IMAGE_FILTERS.intersection(filter_names(image_obj))
+
+
+# --- Fast Picture Squisher for JPEG Pictures ---
+# Pictures that are already JPEGs are re-squished straight from their raw
+# bytes, skipping pypdf's much slower `replace` (which builds a whole mini-PDF
+# for every picture).
+def is_jpeg(image_obj):
+    """True if a picture is a JPEG underneath (any other filters like ASCII85 get unwrapped by store_jpeg)."""
+    filters = filter_names(image_obj)
+    return bool(filters) and filters[-1] == "/DCTDecode"
+
+
+# The standard (quality 50) JPEG brightness table from the JPEG spec. Other
+# qualities are this table scaled up or down, which lets us work out
+# roughly what quality a JPEG was saved with.
+STANDARD_LUMINANCE_TABLE_SUM = sum([
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99,
+])
+
+
+def estimate_jpeg_quality(picture):
+    """
+    Guesses the quality (1-100) a JPEG picture was saved with, from its brightness
+    quantization table - the same trick tools like ImageMagick's `identify` use.
+
+    Returns:
+        int or None: The estimated quality, or None if the picture has no tables.
+    """
+    tables = getattr(picture, "quantization", None)
+    if not tables or 0 not in tables:
+        return None
+    scale = sum(tables[0]) * 100 / STANDARD_LUMINANCE_TABLE_SUM
+    quality = (200 - scale) / 2 if scale <= 100 else 5000 / scale
+    return max(1, min(100, round(quality)))
+
+
+def encode_jpeg(jpeg_bytes, image_quality, needed_size=None):
+    """
+    Re-squishes (and resizes) one JPEG picture, using the extra JPEG_SAVE_OPTIONS tricks.
+
+    JPEGs that were already saved at (or below) the wanted quality are never
+    saved at a higher quality than they already have: that would only make them
+    bigger and blurrier. If they don't need resizing either, they're kept as they are.
+
+    This only touches Pillow (never pypdf), so it's safe to run on many
+    threads at once.
+
+    Returns:
+        tuple: (new JPEG bytes, width, height), or None for JPEG types we
+               don't re-squish ourselves (e.g. CMYK, which has its own colour quirks).
+    """
+    with Image.open(io.BytesIO(jpeg_bytes)) as picture:
+        if picture.mode not in ("RGB", "L"):
+            return None
+        source_quality = estimate_jpeg_quality(picture)
+        already_squished = source_quality is not None and source_quality <= image_quality
+        target_quality = source_quality if already_squished else image_quality
+        new_size = downsampled_size(picture.size, image_quality, needed_size)
+        if new_size is None:
+            if already_squished:
+                return jpeg_bytes, picture.width, picture.height # Already squished as much as we would
+            resized = picture
+        else:
+            # JPEGs can be unpacked straight at 1/2, 1/4 or 1/8 of their size, which is
+            # much quicker than unpacking every pixel and throwing most of them away
+            picture.draft(picture.mode, new_size)
+            resized = picture.resize(new_size, Image.Resampling.LANCZOS)
+        output_img_bytes = io.BytesIO()
+        resized.save(output_img_bytes, format="JPEG", quality=target_quality, **JPEG_SAVE_OPTIONS)
+    return output_img_bytes.getvalue(), resized.width, resized.height
+
+
+def without_kept_alpha(picture, image_obj):
+    """
+    pypdf hands pictures with a see-through mask (/SMask) back as RGBA; the mask
+    is kept separately in the PDF anyway, so only the RGB part needs squishing.
+    """
+    if picture.mode == "RGBA" and "/SMask" in image_obj:
+        return picture.convert("RGB")
+    return picture
+
+
+def put_image_data(image_obj, packed_data, settings, dropped_settings=()):
+    """
+    Swaps the packed data of a PDF picture object in place, along with the
+    settings needed to unpack it, and makes pypdf forget the old picture.
+
+    Args:
+        image_obj: The picture's PDF object.
+        packed_data (bytes): The new packed picture data.
+        settings (dict): PDF key -> new value, e.g. {"/Filter": NameObject("/DCTDecode")}.
+        dropped_settings: PDF keys that no longer apply and are removed.
+    """
+    image_obj._data = packed_data
+    for key, value in settings.items():
+        image_obj[NameObject(key)] = value
+    for key in dropped_settings:
+        image_obj.pop(key, None)
+    image_obj.decoded_self = None # Forget the old picture pypdf may have remembered
+
+
+def store_jpeg(image_obj, jpeg_bytes, width, height, color_space=None):
+    """
+    Puts a freshly squished JPEG back into its PDF picture object - but only if
+    it's actually smaller than what's there now (re-squishing a picture that was
+    already packed well can make it bigger).
+
+    Args:
+        color_space (str): The JPEG's colour space ("/DeviceRGB" or "/DeviceGray"),
+                           if the picture wasn't a JPEG to begin with.
+
+    Returns:
+        bool: True if the picture was replaced.
+    """
+    if len(jpeg_bytes) >= len(image_obj._data):
+        return False
+    settings = {"/Filter": NameObject("/DCTDecode"), "/Width": NumberObject(width), "/Height": NumberObject(height)}
+    dropped_settings = ["/DecodeParms"]
+    if color_space is not None:
+        settings.update({"/ColorSpace": NameObject(color_space), "/BitsPerComponent": NumberObject(8)})
+        dropped_settings.append("/Decode")
+    put_image_data(image_obj, jpeg_bytes, settings, dropped_settings)
+    return True
+
+
+def encode_jpegs(image_objs, image_quality, needed_sizes):
+    """
+    Runs `encode_jpeg` for a bunch of JPEG pictures side by side on threads - Pillow
+    lets go of Python's GIL while it squishes, so they really run at the same time.
+    Each picture's raw JPEG bytes are also unwrapped in its own job, so one that
+    can't even be unpacked is only that picture's problem.
+
+    Args:
+        image_objs (list): The JPEG pictures' PDF objects.
+        image_quality (int): How much to squish pictures (0-100, 0 is most squished/blurry).
+        needed_sizes (list): For each picture, the size it needs where it's drawn (or None).
+
+    Returns:
+        list: One result per picture, in order: whatever `encode_jpeg`
+              returned, or the exception unpacking or squishing it raised.
+    """
+    def encode(image_obj, needed_size):
+        try:
+            return encode_jpeg(image_obj.get_data(), image_quality, needed_size)
+        except IMAGE_ERRORS as e:
+            return e
+
+    if len(image_objs) < 2:
+        return [encode(*job) for job in zip(image_objs, needed_sizes)]
+    with ThreadPoolExecutor(max_workers=min(len(image_objs), os.cpu_count() or 1)) as executor:
+        return list(executor.map(encode, image_objs, needed_sizes))
+
+
+def shrink_images(pages, image_quality):
+    """
+    Squishes (and resizes) all the pictures on a bunch of pages of a PdfWriter.
+
+    The JPEG pictures of all the pages go into one big pile that's squished
+    side by side, so a page with one huge scan doesn't hold up the others.
+
+    Args:
+        pages (list): (page number, page) pairs.
+        image_quality (int): How much to squish pictures (0-100, 0 is most squished/blurry).
+
+    Returns:
+        list: (page number, error) pairs for pictures that couldn't be made smaller.
+    """
+    errors = []
+    jpeg_images, other_images = [], []
+    seen, fingerprints = set(), {}
+    for page_num, page in pages:
+        for image_id, image_obj in find_images(page, seen, fingerprints):
+            if not is_shrinkable(image_obj):
+                continue
+            if is_jpeg(image_obj):
+                jpeg_images.append((page_num, page, image_id, image_obj))
+            else:
+                other_images.append((page_num, page, image_id, image_obj))
+
+    # At low qualities, pictures drawn much smaller than their pixels are cut down to size
+    needed_sizes = needed_picture_sizes(pages) if image_quality <= DPI_LIMIT_MAX_QUALITY else {}
+
+    encoded_jpegs = encode_jpegs([image_obj for *_, image_obj in jpeg_images], image_quality,
+                                 [needed_sizes.get(id(image_obj)) for *_, image_obj in jpeg_images])
+    for (page_num, page, image_id, image_obj), encoded in zip(jpeg_images, encoded_jpegs):
+        if isinstance(encoded, Exception):
+            errors.append((page_num, encoded))
+        elif encoded is None:
+            other_images.append((page_num, page, image_id, image_obj))
+        else:
+            store_jpeg(image_obj, *encoded)
+
+    for page_num, page, image_id, image_obj in other_images:
+        try:
+            img = page.images[image_id] # Only now is this one picture unpacked
+            needed_size = needed_sizes.get(id(image_obj))
+            if (image_quality < PALETTE_BELOW_QUALITY and "/FlateDecode" in filter_names(image_obj)
+                    and store_palette_image(image_obj, img.image, image_quality, needed_size)):
+                continue
+            picture = without_kept_alpha(img.image, image_obj)
+            if picture.mode == "P":
+                picture = picture.convert("RGB")
+            if picture.mode in ("RGB", "L"):
+                # Turned into a JPEG here, so it's only kept if that's actually smaller
+                picture = downsample(picture, image_quality, needed_size)
+                output_img_bytes = io.BytesIO()
+                picture.save(output_img_bytes, format="JPEG", quality=image_quality, **JPEG_SAVE_OPTIONS)
+                store_jpeg(image_obj, output_img_bytes.getvalue(), picture.width, picture.height,
+                           "/DeviceRGB" if picture.mode == "RGB" else "/DeviceGray")
+                continue
+            # Anything more unusual (like CMYK): Pillow's own PDF writer knows how
+            # to pack it; we take care of the resizing
+            store_pdf_image(image_obj, downsample(picture, image_quality, needed_size),
+                            quality=image_quality, **JPEG_SAVE_OPTIONS)
+        except IMAGE_ERRORS as e:
+            errors.append((page_num, e))
+    return errors
+
+
+# Picture settings Pillow's PDF writer may set (or leave out), copied over by `store_pdf_image`
+PDF_IMAGE_KEYS = ("/Filter", "/DecodeParms", "/ColorSpace", "/BitsPerComponent", "/Decode", "/Width", "/Height")
+
+
+def store_pdf_image(image_obj, picture, **save_options):
+    """
+    Packs an unusual picture the way Pillow's own PDF writer does (which is what
+    pypdf's `replace` uses too) and puts it back into its PDF picture object -
+    but only if that's smaller. Unlike `replace`, the picture object itself stays
+    where it is, so things like its see-through mask (/SMask) are kept.
+
+    Args:
+        image_obj: The picture's PDF object.
+        picture (PIL.Image.Image): The (resized) picture.
+        **save_options: Passed on to Pillow, e.g. the JPEG quality.
+
+    Returns:
+        bool: True if the picture was replaced.
+    """
+    pdf_bytes = io.BytesIO()
+    picture.save(pdf_bytes, format="PDF", **save_options)
+    _, packed = next(find_images(PdfReader(pdf_bytes).pages[0]))
+    if len(packed._data) >= len(image_obj._data):
+        return False
+    put_image_data(image_obj, packed._data, {key: packed[key] for key in PDF_IMAGE_KEYS if key in packed},
+                   [key for key in PDF_IMAGE_KEYS if key not in packed])
+    return True
+
+
+# --- Palette Squisher for Diagrams & Screenshots ---
+# Pictures that aren't photos (diagrams, charts, screenshots) are usually
+# stored losslessly (FlateDecode), where JPEG quality does little or even backfires.
+# Boiling them down to a palette of at most 256 colours (like pngquant does)
+# usually makes them 2-4x smaller. It's lossy, so only for low quality settings -
+# and only for pictures that really have few colours: a photo squeezed into a
+# palette comes out posterized and much bigger than the same photo as a JPEG.
+PALETTE_BELOW_QUALITY = 50 # Use palettes for lossless pictures below this Picture Quality
+PALETTE_MAX_COLOURS = 256 # Pictures with more colours than this are photos, not diagrams
+# libimagequant (pngquant's engine) picks the nicest colours, when Pillow was built with it
+QUANTIZE_METHOD = (Image.Quantize.LIBIMAGEQUANT if features.check_feature("libimagequant")
+                   else Image.Quantize.MEDIANCUT)
+
+
+def store_palette_image(image_obj, picture, image_quality, needed_size=None):
+    """
+    Boils a lossless RGB picture with only a few colours (a diagram, chart or
+    screenshot) down to a palette and puts it back into its PDF picture
+    object - but only if that's smaller. Photos are left for the JPEG squisher.
+
+    Args:
+        image_obj: The picture's PDF object.
+        picture (PIL.Image.Image): The unpacked picture.
+        image_quality (int): How much to squish pictures (0-100, 0 is most squished/blurry).
+        needed_size (tuple or None): The size it needs where it's drawn (see `downsample`).
+
+    Returns:
+        bool: True if the picture was replaced.
+    """
+    picture = without_kept_alpha(picture, image_obj)
+    if picture.mode != "RGB" or picture.getcolors(PALETTE_MAX_COLOURS) is None:
+        return False
+    paletted = downsample(picture, image_quality, needed_size).quantize(colors=PALETTE_MAX_COLOURS,
+                                                                       method=QUANTIZE_METHOD)
+    palette = bytes(paletted.getpalette("RGB"))
+    packed_pixels = deflate(paletted.tobytes(), 9)
+    if len(packed_pixels) + len(palette) >= len(image_obj._data):
+        return False
+
+    put_image_data(image_obj, packed_pixels, {
+        "/Filter": NameObject("/FlateDecode"),
+        "/ColorSpace": ArrayObject([
+            NameObject("/Indexed"), NameObject("/DeviceRGB"),
+            NumberObject(len(palette) // 3 - 1), ByteStringObject(palette),
+        ]),
+        "/BitsPerComponent": NumberObject(8),
+        "/Width": NumberObject(paletted.width),
+        "/Height": NumberObject(paletted.height),
+    }, ["/DecodeParms", "/Decode"])
+    return True
+
+
+# --- Declutterer: Duplicate & Unused Bits ---
+# pypdf's compress_identical_objects tells objects apart by hashing them, and for
+# streams that means unpacking every single one first (painfully slow for the
+# old ASCII85 pictures, which pypdf unpacks in pure Python). Two streams with the
+# same packed bytes and the same dictionary are identical anyway, so we hand
+# pypdf a hash of the packed bytes instead. This leans on pypdf internals
+# (`writer._objects`, `stream._data` and swapping out `hash_value` on each
+# stream), which is why requirements.txt pins pypdf to a known-good range.
+def packed_stream_hash(stream):
+    """Like pypdf's `hash_value` for a stream, but without unpacking it."""
+    digest = hashlib.blake2b(DictionaryObject.hash_value_data(stream) + stream._data, digest_size=16)
+    return f"{stream.__class__.__name__}:{digest.hexdigest()}".encode()
+
+
+def declutter(writer, remove_duplicates=True):
+    """
+    Removes unused bits from a PdfWriter, and (optionally) merges identical ones.
+
+    Args:
+        writer (PdfWriter): The PDF to tidy up, just before it's saved.
+        remove_duplicates (bool): Also merge objects that are exact copies of each other.
+    """
+    streams = [obj for obj in writer._objects if isinstance(obj, EncodedStreamObject)]
+    for stream in streams:
+        stream.hash_value = functools.partial(packed_stream_hash, stream)
+    try:
+        writer.compress_identical_objects(remove_duplicates=remove_duplicates, remove_unreferenced=True)
+    finally:
+        for stream in streams:
+            del stream.hash_value
+
+
+# --- Quick Check: Are the Text & Graphics Already Squished? ---
+SMALL_CONTENT_BYTES = 4 * 1024 # Already-compressed text & graphics below this aren't worth re-squishing
+MEDIUM_CONTENT_BYTES = 16 * 1024 # Below this, level 6 packs practically as tight as 9 for a third of the work
+AUTO_BALANCED_FROM_QUALITY = 50 # On "Auto", level 6 is used for every page from this Picture Quality up
+
+
+def content_streams(page):
+    """Returns the (still packed) streams holding a page's text, lines and drawings."""
+    contents = page.get("/Contents")
+    if contents is None:
+        return []
+    contents = contents.get_object()
+    streams = contents if isinstance(contents, list) else [contents]
+    return [stream.get_object() for stream in streams]
+
+
+def is_flate_encoded(stream):
+    """True if a stream is zlib-compressed (FlateDecode) - looked up without unpacking it."""
+    filters = filter_names(stream)
+    return bool(filters) and filters[0] == "/FlateDecode"
+
+
+def flate_encoded_fraction(reader):
+    """
+    Looks (without unpacking anything) at how many of the page content streams
+    (the text, lines and drawings) are already zlib-compressed (FlateDecode).
+    PDFs made by tools like LaTeX or typst usually are, completely.
+
+    Returns:
+        float: Between 0.0 (none are) and 1.0 (all of them are, or there are none at all).
+    """
+    streams = [stream for page in reader.pages for stream in content_streams(page)]
+    if not streams:
+        return 1.0
+    return sum(is_flate_encoded(stream) for stream in streams) / len(streams)
+
+
+PICTURE_ONLY_SAMPLE_PAGES = 3 # How many pages to peek at to spot a scanned / picture-only PDF
+PICTURE_ONLY_CONTENT_BYTES = 1024 # Pages with less text & graphics than this are basically just pictures
+
+
+def is_picture_only(reader):
+    """
+    Peeks (without unpacking anything) at the first few pages to spot scanned or
+    picture-only PDFs: their pages only say "draw this picture here", so
+    squishing the text & graphics is wasted effort - all the bytes are in the pictures.
+
+    Returns:
+        bool: True if (nearly) all the sampled pages have hardly any text & graphics.
+    """
+    sample_pages = reader.pages[:PICTURE_ONLY_SAMPLE_PAGES]
+    if not sample_pages or not all(any(True for _ in find_images(page)) for page in sample_pages):
+        return False # Pages without any pictures at all are just short text pages
+    sizes = sorted(sum(len(stream._data) for stream in content_streams(page)) for page in sample_pages)
+    # The 90th percentile (nearest rank): with only a few sampled pages, that's the biggest one,
+    # so a single text page among the sampled ones is enough to keep the text squishing on
+    return sizes[math.ceil(0.9 * len(sizes)) - 1] < PICTURE_ONLY_CONTENT_BYTES
+
+
+def content_compression_level(page, compression_level, image_quality=None):
+    """
+    Picks how hard to squish one page's text & graphics, based on how much
+    there is (measured without unpacking anything).
+
+    On "Auto", level 6 is plenty for small pages and at higher picture
+    qualities: it's several times quicker than 9 for only a touch bigger
+    files. For the smallest files (and for lossless-only runs), bigger pages
+    go all the way to 9. A level picked by hand is always used as it is.
+
+    Args:
+        page: A page of a PdfWriter.
+        compression_level (int or None): The zlib level (0-9) picked in the app, or None for "Auto".
+        image_quality (int or None): The Picture Quality (None if pictures are left alone).
+
+    Returns:
+        int or None: The zlib level to use, or None to leave the page as it is.
+    """
+    streams = content_streams(page)
+    packed_size = sum(len(stream._data) for stream in streams)
+    if packed_size < SMALL_CONTENT_BYTES and all(is_flate_encoded(stream) for stream in streams):
+        return None # Already small and squished, re-squishing would save next to nothing
+    if compression_level is not None:
+        return compression_level
+    if packed_size < MEDIUM_CONTENT_BYTES or (image_quality is not None
+                                              and image_quality >= AUTO_BALANCED_FROM_QUALITY):
+        return 6
+    return 9
+
+
+# --- Worker: Shrink a Range of Pages (runs in its own process) ---
+CONTENT_PROBLEM = "content" # A page's text & graphics had to be left as they were
+PICTURE_PROBLEM = "picture" # A picture couldn't be made smaller
+
+
+def compress_page_bytes(source_path, start, stop, compression_level=9, image_quality=80, use_zopfli=False,
+                        squish_content=True):
+    """
+    Shrinks the pages `start` up to (but not including) `stop` of a PDF and
+    returns them as a small stand-alone PDF.
+
+    Args:
+        source_path (str): Where the whole original PDF is saved on disk.
+        start (int): Index of the first page to shrink.
+        stop (int): Index just after the last page to shrink.
+        compression_level (int or None): How much to squish text and graphics (0-9, 9 is most).
+                                         None picks it page by page ("Auto", see `content_compression_level`).
+        image_quality (int or None): How much to squish pictures (0-100, 0 is most squished/blurry).
+                                     None leaves the pictures completely alone.
+        use_zopfli (bool): Squeeze text and graphics with the slow-but-stronger zopfli.
+        squish_content (bool): Squish the text and graphics at all (see `is_picture_only`).
+
+    Returns:
+        tuple: (The shrunken pages as PDF bytes, list of problems). Each problem is a
+               (CONTENT_PROBLEM or PICTURE_PROBLEM, page number, details) tuple, so
+               the app can sum them up instead of showing them one by one.
+    """
+    problems = []
+    # The original is mapped into memory straight from disk: the operating system
+    # only loads the parts pypdf actually reads (and shares them between workers)
+    with open(source_path, "rb") as source_file, \
+            mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ) as source_map:
+        reader = PdfReader(source_map)
+        if (start, stop) == (0, len(reader.pages)):
+            # The whole document in one go: copy it over in one piece
+            writer = PdfWriter(clone_from=reader)
+        else:
+            # Copy our stack of pages over together, so anything they share
+            # (like fonts) is only copied once
+            writer = PdfWriter()
+            writer.append(reader, pages=(start, stop), import_outline=False)
+
+        numbered_pages = list(enumerate(writer.pages, start=start))
+        for page_num, current_page_in_writer in (numbered_pages if squish_content else []):
+
+            # Apply lossless compression to text, lines, etc.
+            try:
+                if use_zopfli:
+                    recompress_content_streams(current_page_in_writer, zopfli_deflate)
+                else:
+                    level = content_compression_level(current_page_in_writer, compression_level, image_quality)
+                    if level is not None:
+                        recompress_content_streams(current_page_in_writer, lambda data: deflate(data, level))
+            except LimitReachedError:
+                # pypdf stops unpacking a stream once it grows past a safety limit (so a
+                # booby-trapped "zip bomb" PDF can't eat up all the memory); such a page
+                # is simply left exactly as it was
+                problems.append((CONTENT_PROBLEM, page_num + 1, "suspiciously huge once unpacked"))
+
+        # --- Reduce image quality if you want a smaller file ---
+        if image_quality is not None and image_quality < 100:
+            for page_num, e in shrink_images(numbered_pages, image_quality):
+                problems.append((PICTURE_PROBLEM, page_num + 1, str(e)))
+
+        output_pdf_bytes = io.BytesIO()
+        writer.write(output_pdf_bytes)
+    return output_pdf_bytes.getvalue(), problems
+
+
+def split_page_ranges(page_count, chunk_count):
+    """
+    Cuts `page_count` pages into (at most) `chunk_count` neighbouring ranges of
+    roughly the same size, so every worker gets a fair share.
+
+    Returns:
+        list: (start, stop) pairs in page order.
+    """
+    chunk_count = max(1, min(chunk_count, page_count))
+    chunk_size, extra = divmod(page_count, chunk_count)
+    ranges = []
+    start = 0
+    for chunk_num in range(chunk_count):
+        stop = start + chunk_size + (1 if chunk_num < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
@@ -0,0 +1,37 @@
+# tests/test_app.py
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import app
+
+
+class TidyResultsDirTest(unittest.TestCase):
+    def test_keeps_the_newest_results_and_anything_half_written(self):
+        with tempfile.TemporaryDirectory() as results_dir, \
+                mock.patch.object(app, "get_results_dir", return_value=results_dir):
+            names = [f"digest{num}_9_40_0.pdf" for num in range(app.RESULT_FILES_KEPT + 3)] + ["tmp1234.part"]
+            for age, name in enumerate(names):
+                path = os.path.join(results_dir, name)
+                open(path, "wb").close()
+                os.utime(path, (1000 - age, 1000 - age)) # The first names are the newest
+            app.tidy_results_dir()
+            self.assertEqual(sorted(os.listdir(results_dir)),
+                             sorted(names[:app.RESULT_FILES_KEPT] + ["tmp1234.part"]))
+
+
+class DescribePagesTest(unittest.TestCase):
+    def test_one_page(self):
+        self.assertEqual(app.describe_pages([4, 4]), "page 4")
+
+    def test_sorted_without_repeats(self):
+        self.assertEqual(app.describe_pages([9, 2, 5, 2]), "pages 2, 5 and 9")
+
+    def test_long_lists_are_cut_short(self):
+        self.assertEqual(app.describe_pages(range(1, 8), max_listed=3), "pages 1, 2, 3 and 4 more")
+
+
+if __name__ == "__main__":
+    unittest.main()
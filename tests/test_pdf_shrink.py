@@ -0,0 +1,240 @@
+# tests/test_pdf_shrink.py
+
+import io
+import unittest
+import zlib
+from unittest import mock
+
+from PIL import Image, ImageDraw
+from pypdf import PdfWriter
+from pypdf.generic import (ArrayObject, DecodedStreamObject, DictionaryObject, EncodedStreamObject, NameObject,
+                           NumberObject)
+
+import pdf_shrink
+
+
+def page_drawing(instructions):
+    """A blank page of a PdfWriter whose drawing instructions are `instructions`."""
+    page = PdfWriter().add_blank_page(612, 792)
+    contents = DecodedStreamObject()
+    contents.set_data(instructions)
+    page.replace_contents(contents)
+    return page
+
+
+def picture_object(writer, data, width, height, settings=None):
+    """
+    Adds a picture's PDF object to a PdfWriter (8-bit RGB with unpacked
+    pixels, unless `settings` say otherwise) and returns it.
+    """
+    picture = EncodedStreamObject()
+    picture._data = data
+    picture.update({
+        NameObject("/Type"): NameObject("/XObject"), NameObject("/Subtype"): NameObject("/Image"),
+        NameObject("/Width"): NumberObject(width), NameObject("/Height"): NumberObject(height),
+        NameObject("/ColorSpace"): NameObject("/DeviceRGB"), NameObject("/BitsPerComponent"): NumberObject(8),
+    })
+    picture.update({NameObject(key): value for key, value in (settings or {}).items()})
+    writer._add_object(picture)
+    return picture
+
+
+def page_showing(writer, pictures):
+    """Adds a page to a PdfWriter that lists `pictures` (name -> picture object) in its resources."""
+    page = writer.add_blank_page(612, 792)
+    page[NameObject("/Resources")] = DictionaryObject({NameObject("/XObject"): DictionaryObject({
+        NameObject(name): picture.indirect_reference for name, picture in pictures.items()
+    })})
+    return page
+
+
+class RecompressContentStreamsTest(unittest.TestCase):
+    INSTRUCTIONS = b"0 0 m 100 100 l S\n" * 200
+
+    def test_replaces_with_something_smaller(self):
+        page = page_drawing(self.INSTRUCTIONS)
+        self.assertTrue(pdf_shrink.recompress_content_streams(page, lambda data: pdf_shrink.deflate(data, 9)))
+        [stream] = pdf_shrink.content_streams(page)
+        self.assertEqual(stream["/Filter"], "/FlateDecode")
+        self.assertEqual(zlib.decompress(stream._data), self.INSTRUCTIONS)
+
+    def test_keeps_what_is_already_packed_tighter(self):
+        page = page_drawing(self.INSTRUCTIONS)
+        pdf_shrink.recompress_content_streams(page, lambda data: pdf_shrink.deflate(data, 9))
+        [packed] = pdf_shrink.content_streams(page)
+        self.assertFalse(pdf_shrink.recompress_content_streams(page, lambda data: pdf_shrink.deflate(data, 0)))
+        self.assertEqual(pdf_shrink.content_streams(page), [packed])
+
+
+class DownsampledSizeTest(unittest.TestCase):
+    def test_small_pictures_are_left_alone(self):
+        self.assertIsNone(pdf_shrink.downsampled_size((150, 1000), 10))
+
+    def test_scale_follows_the_quality(self):
+        self.assertEqual(pdf_shrink.downsampled_size((1000, 500), 100), (980, 490))
+
+    def test_big_pictures_are_capped_at_low_quality(self):
+        width, height = pdf_shrink.downsampled_size((4000, 3000), 40)
+        self.assertLessEqual(max(width, height), 1200)
+        self.assertAlmostEqual(width / height, 4 / 3, places=2)
+
+    def test_pictures_drawn_much_smaller_are_cut_down_to_size(self):
+        self.assertEqual(pdf_shrink.downsampled_size((3000, 2000), 60, needed_size=(600, 400)), (600, 400))
+
+    def test_slightly_oversized_pictures_only_get_the_normal_scale(self):
+        self.assertEqual(pdf_shrink.downsampled_size((1000, 1000), 60, needed_size=(600, 600)),
+                         pdf_shrink.downsampled_size((1000, 1000), 60))
+
+
+class FindImagesTest(unittest.TestCase):
+    def test_copies_are_pointed_at_the_first_one(self):
+        writer = PdfWriter()
+        logo, logo_again = (picture_object(writer, b"\x80" * 64 * 64 * 3, 64, 64) for _ in range(2))
+        first_page = page_showing(writer, {"/Im0": logo})
+        second_page = page_showing(writer, {"/Im7": logo_again})
+        seen, fingerprints = set(), {}
+        self.assertEqual([picture for _, picture in pdf_shrink.find_images(first_page, seen, fingerprints)], [logo])
+        self.assertEqual(list(pdf_shrink.find_images(second_page, seen, fingerprints)), [])
+        self.assertIs(second_page["/Resources"]["/XObject"]["/Im7"].get_object(), logo)
+
+    def test_pictures_on_different_layers_are_kept_apart(self):
+        writer = PdfWriter()
+        layer = writer._add_object(DictionaryObject({NameObject("/Type"): NameObject("/OCG")}))
+        picture = picture_object(writer, b"\x80" * 64 * 64 * 3, 64, 64)
+        layered_picture = picture_object(writer, b"\x80" * 64 * 64 * 3, 64, 64, {"/OC": layer})
+        page = page_showing(writer, {"/Im0": picture, "/Im1": layered_picture})
+        self.assertEqual(len(list(pdf_shrink.find_images(page))), 2)
+        self.assertIs(page["/Resources"]["/XObject"]["/Im1"].get_object(), layered_picture)
+
+
+class DrawnSizesTest(unittest.TestCase):
+    def test_follows_nested_transformations(self):
+        page = page_drawing(b"q 200 0 0 100 10 10 cm /Im0 Do Q "
+                            b"q 0.5 0 0 0.5 0 0 cm q 800 0 0 300 0 0 cm /Im0 Do Q Q "
+                            b"/Im1 Do")
+        sizes = pdf_shrink.drawn_sizes(page)
+        self.assertEqual(sizes["/Im0"], (400, 150)) # The biggest width and height it's drawn at
+        self.assertEqual(sizes["/Im1"], (1, 1)) # Back to the untouched matrix after Q
+
+    def test_rotated_pictures(self):
+        sizes = pdf_shrink.drawn_sizes(page_drawing(b"0 100 -50 0 300 300 cm /Im0 Do"))
+        self.assertEqual(sizes["/Im0"], (100, 50))
+
+    def test_pages_with_too_many_instructions_are_unknown(self):
+        filler = b"0 0 m 1 1 l S\n" * (pdf_shrink.MAX_DPI_CHECK_CONTENT_BYTES // 14 + 1)
+        self.assertIsNone(pdf_shrink.drawn_sizes(page_drawing(filler)))
+
+
+class EstimateJpegQualityTest(unittest.TestCase):
+    def test_matches_the_quality_it_was_saved_with(self):
+        picture = Image.linear_gradient("L").convert("RGB")
+        for quality in (20, 50, 75, 95):
+            jpeg_bytes = io.BytesIO()
+            picture.save(jpeg_bytes, format="JPEG", quality=quality)
+            with Image.open(jpeg_bytes) as jpeg:
+                self.assertAlmostEqual(pdf_shrink.estimate_jpeg_quality(jpeg), quality, delta=1)
+
+    def test_no_tables_no_guess(self):
+        self.assertIsNone(pdf_shrink.estimate_jpeg_quality(Image.new("RGB", (8, 8))))
+
+
+class StoreJpegTest(unittest.TestCase):
+    def test_smaller_jpegs_replace_the_picture(self):
+        picture = picture_object(PdfWriter(), b"\x80" * 100 * 100 * 3, 100, 100,
+                                 {"/DecodeParms": DictionaryObject(), "/Decode": ArrayObject()})
+        self.assertTrue(pdf_shrink.store_jpeg(picture, b"jpeg" * 10, 50, 40, "/DeviceGray"))
+        self.assertEqual(picture._data, b"jpeg" * 10)
+        self.assertEqual((picture["/Filter"], picture["/Width"], picture["/Height"], picture["/ColorSpace"]),
+                         ("/DCTDecode", 50, 40, "/DeviceGray"))
+        self.assertNotIn("/DecodeParms", picture)
+        self.assertNotIn("/Decode", picture)
+
+    def test_bigger_jpegs_are_thrown_away(self):
+        picture = picture_object(PdfWriter(), b"packed" * 10, 100, 100, {"/Filter": NameObject("/DCTDecode")})
+        self.assertFalse(pdf_shrink.store_jpeg(picture, b"jpeg" * 100, 50, 40))
+        self.assertEqual((picture._data, picture["/Width"]), (b"packed" * 10, 100))
+
+
+class EncodeJpegsTest(unittest.TestCase):
+    def test_a_picture_that_cant_be_unpacked_is_only_its_own_problem(self):
+        writer = PdfWriter()
+        jpeg_bytes = io.BytesIO()
+        Image.linear_gradient("L").convert("RGB").save(jpeg_bytes, format="JPEG", quality=95)
+        good = picture_object(writer, jpeg_bytes.getvalue(), 256, 256, {"/Filter": NameObject("/DCTDecode")})
+        broken = picture_object(writer, b"not hex at all", 256, 256, {
+            "/Filter": ArrayObject([NameObject("/ASCIIHexDecode"), NameObject("/DCTDecode")]),
+        })
+        encoded_good, encoded_broken = pdf_shrink.encode_jpegs([good, broken], 30, [None, None])
+        self.assertIsInstance(encoded_good, tuple)
+        self.assertIsInstance(encoded_broken, pdf_shrink.IMAGE_ERRORS)
+
+
+class StorePaletteImageTest(unittest.TestCase):
+    def test_diagrams_get_a_palette(self):
+        diagram = Image.new("RGB", (400, 300), "white")
+        draw = ImageDraw.Draw(diagram)
+        draw.rectangle((40, 40, 200, 150), fill="navy")
+        draw.ellipse((220, 120, 380, 280), fill="orange", outline="black", width=4)
+        picture = picture_object(PdfWriter(), diagram.tobytes(), 400, 300)
+        self.assertTrue(pdf_shrink.store_palette_image(picture, diagram, 30))
+        self.assertEqual(picture["/ColorSpace"][0], "/Indexed")
+        self.assertEqual(len(zlib.decompress(picture._data)), picture["/Width"] * picture["/Height"])
+
+    def test_photos_are_left_for_the_jpeg_squisher(self):
+        photo = Image.merge("RGB", [Image.effect_noise((400, 300), 40) for _ in range(3)])
+        picture = picture_object(PdfWriter(), photo.tobytes(), 400, 300)
+        self.assertFalse(pdf_shrink.store_palette_image(picture, photo, 30))
+        self.assertEqual(picture._data, photo.tobytes())
+
+
+class DeclutterTest(unittest.TestCase):
+    def test_merges_identical_pictures_without_leaving_hash_patches(self):
+        writer = PdfWriter()
+        pictures = [picture_object(writer, b"\x80" * 64 * 64 * 3, 64, 64) for _ in range(2)]
+        pages = [page_showing(writer, {"/Im0": picture}) for picture in pictures]
+        pdf_shrink.declutter(writer)
+        self.assertEqual(pages[0]["/Resources"]["/XObject"].raw_get("/Im0"),
+                         pages[1]["/Resources"]["/XObject"].raw_get("/Im0"))
+        for picture in pictures:
+            self.assertNotIn("hash_value", vars(picture))
+
+    def test_hash_patches_are_removed_when_pypdf_fails(self):
+        writer = PdfWriter()
+        picture = picture_object(writer, b"\x80" * 64 * 64 * 3, 64, 64)
+        page_showing(writer, {"/Im0": picture})
+        with mock.patch.object(writer, "compress_identical_objects", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                pdf_shrink.declutter(writer)
+        self.assertNotIn("hash_value", vars(picture))
+
+
+class ContentCompressionLevelTest(unittest.TestCase):
+    SMALL_PAGE = b"0 0 m 100 100 l S\n" * 100
+    BIG_PAGE = b"0 0 m 100 100 l S\n" * 1000
+
+    def test_small_packed_pages_are_left_alone(self):
+        page = page_drawing(self.SMALL_PAGE)
+        pdf_shrink.recompress_content_streams(page, lambda data: pdf_shrink.deflate(data, 9))
+        self.assertIsNone(pdf_shrink.content_compression_level(page, 9))
+
+    def test_a_level_picked_by_hand_is_used_as_it_is(self):
+        self.assertEqual(pdf_shrink.content_compression_level(page_drawing(self.SMALL_PAGE), 9, 30), 9)
+        self.assertEqual(pdf_shrink.content_compression_level(page_drawing(self.BIG_PAGE), 1, 30), 1)
+
+    def test_auto_goes_easy_on_small_pages_and_high_qualities(self):
+        self.assertEqual(pdf_shrink.content_compression_level(page_drawing(self.SMALL_PAGE), None, 30), 6)
+        self.assertEqual(pdf_shrink.content_compression_level(page_drawing(self.BIG_PAGE), None, 80), 6)
+        self.assertEqual(pdf_shrink.content_compression_level(page_drawing(self.BIG_PAGE), None, 30), 9)
+        self.assertEqual(pdf_shrink.content_compression_level(page_drawing(self.BIG_PAGE), None, None), 9)
+
+
+class SplitPageRangesTest(unittest.TestCase):
+    def test_neighbouring_ranges_of_fair_size(self):
+        self.assertEqual(pdf_shrink.split_page_ranges(10, 3), [(0, 4), (4, 7), (7, 10)])
+
+    def test_never_more_ranges_than_pages(self):
+        self.assertEqual(pdf_shrink.split_page_ranges(2, 8), [(0, 1), (1, 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()